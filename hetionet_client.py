@@ -1,172 +1,534 @@
 import argparse
 import csv
+import queue
+import threading
 import time
-from neo4j import GraphDatabase
-from pymongo import MongoClient
-from typing import Dict, List, Any
+from collections import defaultdict
+from functools import cached_property
+from neo4j import GraphDatabase, Result
+from pymongo import MongoClient, ReplaceOne
+from typing import Dict, List, Any, Optional, Tuple
+
+BATCH_SIZE = 10000
+MONGO_BATCH_SIZE = 1000
+APOC_FLUSH_SIZE = 100000
+WRITE_WORKERS = 16
+WRITE_QUEUE_SIZE = 8
+
+#Hetionet metaedge -> (source label, target label, relationship type)
+#keys have direction markers stripped, so Gr>G is looked up as GrG
+METAEDGES = {
+    'AdG': ('Anatomy', 'Gene', 'DOWNREGULATES'),
+    'AeG': ('Anatomy', 'Gene', 'EXPRESSES'),
+    'AuG': ('Anatomy', 'Gene', 'UPREGULATES'),
+    'CbG': ('Compound', 'Gene', 'BINDS'),
+    'CcSE': ('Compound', 'Side Effect', 'CAUSES'),
+    'CdG': ('Compound', 'Gene', 'DOWNREGULATES'),
+    'CpD': ('Compound', 'Disease', 'PALLIATES'),
+    'CrC': ('Compound', 'Compound', 'RESEMBLES'),
+    'CRC': ('Compound', 'Compound', 'RESEMBLES'),
+    'CtD': ('Compound', 'Disease', 'TREATS'),
+    'CuG': ('Compound', 'Gene', 'UPREGULATES'),
+    'DaG': ('Disease', 'Gene', 'ASSOCIATES'),
+    'DdG': ('Disease', 'Gene', 'DOWNREGULATES'),
+    'DlA': ('Disease', 'Anatomy', 'LOCALIZES_TO'),
+    'DpS': ('Disease', 'Symptom', 'PRESENTS'),
+    'DrD': ('Disease', 'Disease', 'RESEMBLES'),
+    'DRD': ('Disease', 'Disease', 'RESEMBLES'),
+    'DuG': ('Disease', 'Gene', 'UPREGULATES'),
+    'GcG': ('Gene', 'Gene', 'COVARIES'),
+    'GiG': ('Gene', 'Gene', 'INTERACTS'),
+    'GpBP': ('Gene', 'Biological Process', 'PARTICIPATES'),
+    'GpCC': ('Gene', 'Cellular Component', 'PARTICIPATES'),
+    'GpMF': ('Gene', 'Molecular Function', 'PARTICIPATES'),
+    'GpPW': ('Gene', 'Pathway', 'PARTICIPATES'),
+    'GrG': ('Gene', 'Gene', 'REGULATES'),
+    'GRG': ('Gene', 'Gene', 'REGULATES'),
+    'PCiC': ('Pharmacologic Class', 'Compound', 'INCLUDES')
+}
+METAEDGE_LABELS = {label for source, target, _ in METAEDGES.values() for label in (source, target)}
+
+
+def _run_write(tx, query: str, **params):
+    #Unit of work for session.execute_write, returns the summary counters
+    return tx.run(query, **params).consume().counters
+
+
+def _read_tsv(f, *columns: str):
+    #Return a csv.reader over f and the positions of the named columns;
+    #header names are matched case-insensitively
+    reader = csv.reader(f, delimiter='\t')
+    header = [h.lower() for h in next(reader)]
+    return reader, [header.index(column) for column in columns]
+
+
+class _WritePipeline:
+    #Producer/consumer pipeline: the caller parses and put()s batches while
+    #worker threads write them. The bounded queues apply back-pressure so at
+    #most about maxsize batches wait in memory.
+    #A partitioned pipeline gives each worker its own queue and sends every
+    #batch with the same put(key=...) to the same worker, so batches that
+    #would contend for the same locks are written serially.
+    
+    def __init__(self, write, workers: int = WRITE_WORKERS, maxsize: int = WRITE_QUEUE_SIZE,
+                 partitioned: bool = False):
+        self.write = write
+        queue_count = workers if partitioned else 1
+        self.queues = [queue.Queue(maxsize=max(1, maxsize // queue_count))
+                       for _ in range(queue_count)]
+        self.routes = {}
+        self.errors = []
+        self.threads = [threading.Thread(target=self._consume, args=(self.queues[i % queue_count],),
+                                         daemon=True)
+                        for i in range(workers)]
+    
+    def __enter__(self):
+        for thread in self.threads:
+            thread.start()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        for i in range(len(self.threads)):
+            self.queues[i % len(self.queues)].put(None)
+        for thread in self.threads:
+            thread.join()
+        if exc_type is None and self.errors:
+            raise self.errors[0]
+        return False
+    
+    def put(self, *item, key=None):
+        #fail fast so a fatal write error stops the producer's parse
+        if self.errors:
+            raise self.errors[0]
+        #keys are assigned to queues round-robin on first sight
+        if key not in self.routes:
+            self.routes[key] = len(self.routes) % len(self.queues)
+        self.queues[self.routes[key]].put(item)
+    
+    def _consume(self, work_queue):
+        while True:
+            item = work_queue.get()
+            if item is None:
+                return
+            #keep draining after a failure so the producer never blocks
+            if self.errors:
+                continue
+            try:
+                self.write(*item)
+            except Exception as e:
+                self.errors.append(e)
 
 
 class HetioNetDB:
     
     def __init__(self, neo4j_uri: str, neo4j_user: str, neo4j_password: str,
-                 mongo_uri: str, mongo_db: str):
-        self.neo4j_driver = GraphDatabase.driver(
-            neo4j_uri, 
-            auth=(neo4j_user, neo4j_password)
-        )
-        
-        #MongoDB connection
-        self.mongo_client = MongoClient(mongo_uri)
-        self.mongo_db = self.mongo_client[mongo_db]
-        self.diseases_collection = self.mongo_db['diseases']
+                 mongo_uri: str, mongo_db: str,
+                 pool_size: int = 32, pool_timeout: float = 60.0,
+                 neo4j_database: Optional[str] = None):
+        #Connections are opened lazily on first use, so a cached Query 1 never
+        #starts a Neo4j driver and Query 2 against Neo4j never starts a Mongo client
+        self.neo4j_uri = neo4j_uri
+        self.neo4j_auth = (neo4j_user, neo4j_password)
+        self.mongo_uri = mongo_uri
+        self.mongo_db_name = mongo_db
+        self.pool_size = pool_size
+        self.pool_timeout = pool_timeout
+        #None uses the server's default database
+        self.neo4j_database = neo4j_database
         
-        print("Connected to Neo4j and MongoDB")
+        #edge Cypher is built once per metaedge so every batch sends identical
+        #text and hits Neo4j's plan cache; unknown metaedges are added on first use
+        self._edge_cypher = {metaedge: self._build_edge_cypher(metaedge) for metaedge in METAEDGES}
+    
+    @cached_property
+    def neo4j_driver(self):
+        #Use a larger pool (32) for ingest and a smaller one (8) for queries
+        driver = GraphDatabase.driver(
+            self.neo4j_uri, 
+            auth=self.neo4j_auth,
+            max_connection_pool_size=self.pool_size,
+            connection_acquisition_timeout=self.pool_timeout,
+            keep_alive=True,
+            max_connection_lifetime=3600,
+            #edge batches of different label pairs can still share a node (Gene),
+            #give execute_write more than the default 30s to retry deadlocks
+            max_transaction_retry_time=120
+        )
+        print("Connected to Neo4j")
+        return driver
+    
+    def _ensure_driver(self):
+        #Build the lazy driver on the calling thread before any pipeline starts;
+        #cached_property is not locked, so workers racing on first access could
+        #each build (and leak) a driver
+        return self.neo4j_driver
+    
+    @cached_property
+    def mongo_client(self):
+        client = MongoClient(self.mongo_uri)
+        print("Connected to MongoDB")
+        return client
+    
+    @property
+    def mongo_db(self):
+        return self.mongo_client[self.mongo_db_name]
+    
+    @property
+    def diseases_collection(self):
+        return self.mongo_db['diseases']
+    
+    @property
+    def treatments_collection(self):
+        return self.mongo_db['treatments']
     
     def close(self):
-        self.neo4j_driver.close()
-        self.mongo_client.close()
+        #only close connections that were actually opened
+        if 'neo4j_driver' in self.__dict__:
+            self.neo4j_driver.close()
+        if 'mongo_client' in self.__dict__:
+            self.mongo_client.close()
         print("Database connections closed")
     
     # ==================== DATA LOADING ====================
     
-    def load_nodes(self, nodes_file: str):
+    def load_nodes(self, nodes_file: str, use_apoc: bool = False):
         print(f"\nLoading nodes from {nodes_file}...")
+        self._ensure_driver()
+        
+        #incremental index maintenance slows bulk CREATE, rebuild once loaded
+        self._drop_indexes()
+        
+        if use_apoc:
+            self._create_indexes(self._load_nodes_apoc(nodes_file))
+            return
+        
+        buffers = defaultdict(list)
+        counts = defaultdict(int)
+        
+        def write(kind, nodes):
+            query = f"""
+                UNWIND $nodes AS node
+                CREATE (n:`{kind}` {{id: node.id, name: node.name}})
+            """
+            self._write_chunk(query, nodes=nodes)
         
-        with open(nodes_file, 'r') as f:
-            reader = csv.DictReader(f, delimiter='\t')
-            nodes_by_kind = {}
+        #stream rows; each kind's buffer is handed to the write pipeline as
+        #soon as it fills, so parsing overlaps with Neo4j writes
+        with _WritePipeline(write) as pipeline, open(nodes_file, 'r') as f:
+            def flush(kind, nodes):
+                pipeline.put(kind, nodes)
+                counts[kind] += len(nodes)
+            
+            reader, (id_i, name_i, kind_i) = _read_tsv(f, 'id', 'name', 'kind')
             
             for row in reader:
-                node_id = row.get('Id') or row.get('id')
-                name = row.get('Name') or row.get('name')
-                kind = row.get('Kind') or row.get('kind')
-                
-                if kind not in nodes_by_kind:
-                    nodes_by_kind[kind] = []
-                
-                nodes_by_kind[kind].append({'id': node_id, 'name': name})
-        
-        #create nodes in Neo
-        with self.neo4j_driver.session() as session:
-            for kind, nodes in nodes_by_kind.items():
-                session.run(f"""
-                    UNWIND $nodes AS node
-                    CREATE (n:{kind} {{id: node.id, name: node.name}})
-                """, nodes=nodes)
-                print(f"Created {len(nodes)} {kind} nodes")
-        
-        #create indexes
-        self._create_indexes()
-    
-    def load_edges(self, edges_file: str):
+                #csv.reader yields [] for blank lines
+                if not row:
+                    continue
+                kind = row[kind_i]
+                buffer = buffers[kind]
+                buffer.append({'id': row[id_i], 'name': row[name_i]})
+                if len(buffer) >= BATCH_SIZE:
+                    flush(kind, buffer)
+                    buffers[kind] = []
+            
+            for kind, nodes in buffers.items():
+                if nodes:
+                    flush(kind, nodes)
+        
+        for kind, count in counts.items():
+            print(f"Created {count} {kind} nodes")
+        
+        #index every kind that was loaded so edge MATCHes never scan a label
+        self._create_indexes(counts.keys())
+    
+    def _load_nodes_apoc(self, nodes_file: str) -> List[str]:
+        #Mixed-kind batches; apoc.create.node sets the label per row, so the
+        #parse loop does no grouping by kind
+        query = """
+            UNWIND $nodes AS node
+            CALL apoc.create.node([node.kind], {id: node.id, name: node.name}) YIELD node AS n
+            RETURN count(*)
+        """
+        total = 0
+        
+        with _WritePipeline(lambda nodes: self._write_chunk(query, nodes=nodes)) as pipeline, \
+                open(nodes_file, 'r') as f:
+            reader, (id_i, name_i, kind_i) = _read_tsv(f, 'id', 'name', 'kind')
+            
+            buffer = []
+            for row in reader:
+                if not row:
+                    continue
+                buffer.append({'id': row[id_i], 'name': row[name_i], 'kind': row[kind_i]})
+                if len(buffer) >= BATCH_SIZE:
+                    pipeline.put(buffer)
+                    total += len(buffer)
+                    buffer = []
+            
+            if buffer:
+                pipeline.put(buffer)
+                total += len(buffer)
+        
+        print(f"Created {total} nodes")
+        
+        #labels come from the graph rather than being tracked in the parse loop
+        labels, _, _ = self.neo4j_driver.execute_query(
+            "CALL db.labels() YIELD label RETURN label",
+            database_=self.neo4j_database
+        )
+        return [record['label'] for record in labels]
+    
+    def load_edges(self, edges_file: str, use_apoc: bool = False):
         print(f"\nLoading edges from {edges_file}...")
+        self._ensure_driver()
         
-        with open(edges_file, 'r') as f:
-            reader = csv.DictReader(f, delimiter='\t')
-            edges_by_type = {}
+        buffers = defaultdict(list)
+        #relationships actually created (server counters), updated by the workers
+        created = defaultdict(int)
+        created_lock = threading.Lock()
+        #APOC batches on the server, so hand it larger slices per call and run
+        #one iterate at a time, concurrent iterates contend for endpoint locks.
+        #Its buffer is also flushed whenever the metaedge changes, so only one
+        #APOC_FLUSH_SIZE buffer is held and at most one more waits queued
+        flush_size = APOC_FLUSH_SIZE if use_apoc else BATCH_SIZE
+        workers = 1 if use_apoc else WRITE_WORKERS
+        queue_size = 1 if use_apoc else WRITE_QUEUE_SIZE
+        
+        #CREATE locks both endpoints, so batches with the same endpoint labels
+        #(GiG, GrG and GcG all join Gene to Gene) go to one writer; parallelism
+        #is only across label pairs, where in-flight batches rarely share nodes
+        route_keys = {}
+        
+        def route_key(metaedge):
+            if metaedge not in route_keys:
+                source_label, target_label, _ = self._parse_metaedge(metaedge)
+                route_keys[metaedge] = (source_label, target_label) if source_label else metaedge
+            return route_keys[metaedge]
+        
+        def write(metaedge, edges):
+            unwind_query, action = self._get_edge_cypher(metaedge)
+            if use_apoc:
+                count = self._write_edges_apoc(action, edges)
+            else:
+                count = self._write_chunk(unwind_query, edges=edges).relationships_created
+            with created_lock:
+                created[metaedge] += count
+        
+        #stream rows; full buffers are written by the pipeline's workers, each
+        #with its own pooled session, and execute_write retries transient deadlocks
+        with _WritePipeline(write, workers, queue_size, partitioned=True) as pipeline, \
+                open(edges_file, 'r') as f:
+            def flush(metaedge, edges):
+                pipeline.put(metaedge, edges, key=route_key(metaedge))
+            
+            reader, (source_i, target_i, metaedge_i) = _read_tsv(f, 'source', 'target', 'metaedge')
             
+            last_metaedge = None
             for row in reader:
-                source = row.get('Source') or row.get('source')
-                target = row.get('Target') or row.get('target')
-                metaedge = row.get('Metaedge') or row.get('metaedge')
-                
-                if metaedge not in edges_by_type:
-                    edges_by_type[metaedge] = []
-                
-                edges_by_type[metaedge].append({
-                    'source': source, 
-                    'target': target
-                })
-        
-        with self.neo4j_driver.session() as session:
-            for metaedge, edges in edges_by_type.items():
-                rel_type = self._parse_metaedge(metaedge)
-
-                session.run(f"""
-                    UNWIND $edges AS edge
-                    MATCH (source {{id: edge.source}})
-                    MATCH (target {{id: edge.target}})
-                    CREATE (source)-[:{rel_type}]->(target)
-                """, edges=edges)
-                print(f"Created {len(edges)} {rel_type} relationships")
-    
-    def _parse_metaedge(self, metaedge: str) -> str:
+                if not row:
+                    continue
+                metaedge = row[metaedge_i]
+                if use_apoc and metaedge != last_metaedge:
+                    if buffers[last_metaedge]:
+                        flush(last_metaedge, buffers[last_metaedge])
+                        buffers[last_metaedge] = []
+                    last_metaedge = metaedge
+                buffer = buffers[metaedge]
+                buffer.append({'source': row[source_i], 'target': row[target_i]})
+                if len(buffer) >= flush_size:
+                    flush(metaedge, buffer)
+                    buffers[metaedge] = []
+            
+            for metaedge, edges in buffers.items():
+                if edges:
+                    flush(metaedge, edges)
+        
+        for metaedge, count in created.items():
+            print(f"Created {count} {self._parse_metaedge(metaedge)[2]} relationships ({metaedge})")
+    
+    def _write_edges_apoc(self, action: str, edges: List[Dict]) -> int:
+        #Server-side batching with apoc.periodic.iterate, returns the number of
+        #relationships created and raises if any batch failed
+        with self.neo4j_driver.session(database=self.neo4j_database) as session:
+            result = session.run("""
+                CALL apoc.periodic.iterate(
+                    "UNWIND $edges AS edge RETURN edge",
+                    $action,
+                    {batchSize: $batchSize, parallel: false, retries: 3,
+                     params: {edges: $edges}}
+                )
+                YIELD failedOperations, failedBatches, errorMessages, updateStatistics
+                RETURN failedOperations, failedBatches, errorMessages, updateStatistics
+            """, action=action, batchSize=BATCH_SIZE, edges=edges).single()
+        
+        if result['failedBatches'] or result['failedOperations']:
+            raise RuntimeError(
+                f"apoc.periodic.iterate failed {result['failedOperations']} operations "
+                f"in {result['failedBatches']} batches: {result['errorMessages']}"
+            )
+        #committedOperations counts driving rows, even when a MATCH misses
+        return result['updateStatistics']['relationshipsCreated']
+    
+    def _write_chunk(self, query: str, **params):
+        with self.neo4j_driver.session(database=self.neo4j_database) as session:
+            return session.execute_write(_run_write, query, **params)
+    
+    def _parse_metaedge(self, metaedge: str) -> Tuple[Optional[str], Optional[str], str]:
         clean_metaedge = metaedge.replace('>', '').replace('<', '')
+        if clean_metaedge in METAEDGES:
+            return METAEDGES[clean_metaedge]
+        #unknown metaedge: label-less MATCH and a derived relationship type
+        return None, None, clean_metaedge.upper()
+    
+    def _build_edge_cypher(self, metaedge: str) -> Tuple[str, str]:
+        #Per-edge MATCH/CREATE with label-qualified endpoints so the id index is used,
+        #returned as (UNWIND batch query, apoc.periodic.iterate action)
+        source_label, target_label, rel_type = self._parse_metaedge(metaedge)
+        source_clause = f":`{source_label}`" if source_label else ""
+        target_clause = f":`{target_label}`" if target_label else ""
+        action = f"""
+            MATCH (source{source_clause} {{id: edge.source}})
+            MATCH (target{target_clause} {{id: edge.target}})
+            CREATE (source)-[:{rel_type}]->(target)
+        """
+        return "UNWIND $edges AS edge" + action, action
+    
+    def _get_edge_cypher(self, metaedge: str) -> Tuple[str, str]:
+        cypher = self._edge_cypher.get(metaedge)
+        if cypher is None:
+            cypher = self._edge_cypher.setdefault(metaedge, self._build_edge_cypher(metaedge))
+        return cypher
+    
+    def _drop_indexes(self):
+        #Drop only the id indexes this client owns: unconstrained single-label
+        #RANGE indexes on a Hetionet label that _create_indexes rebuilds
+        records, _, _ = self.neo4j_driver.execute_query("""
+            SHOW INDEXES YIELD name, type, entityType, labelsOrTypes, properties, owningConstraint
+            WHERE type = 'RANGE' AND entityType = 'NODE'
+              AND properties = ['id'] AND owningConstraint IS NULL
+              AND size(labelsOrTypes) = 1 AND labelsOrTypes[0] IN $labels
+            RETURN name
+        """, labels=sorted(METAEDGE_LABELS), database_=self.neo4j_database)
         
-        mapping = {
-            'GiG': 'INTERACTS',
-            'GrG': 'REGULATES',
-            'GcG': 'COVARIES',
-            'CtD': 'TREATS',
-            'CpD': 'PALLIATES',
-            'CuG': 'UPREGULATES',
-            'CdG': 'DOWNREGULATES',
-            'CbG': 'BINDS',
-            'DaG': 'ASSOCIATES',
-            'DuG': 'UPREGULATES',
-            'DdG': 'DOWNREGULATES',
-            'DlA': 'LOCALIZES_TO',
-            'AuG': 'UPREGULATES',
-            'AdG': 'DOWNREGULATES',
-            'AeG': 'EXPRESSES',
-            'CRC': 'RESEMBLES',
-            'DRD': 'RESEMBLES',
-            'GRG': 'REGULATES'
-        }
-        return mapping.get(clean_metaedge, clean_metaedge.upper().replace('>', '_').replace('<', '_'))
+        for record in records:
+            self.neo4j_driver.execute_query(
+                f"DROP INDEX `{record['name']}` IF EXISTS",
+                database_=self.neo4j_database
+            )
+        if records:
+            print(f"Dropped {len(records)} indexes")
     
-    def _create_indexes(self):
-        with self.neo4j_driver.session() as session:
-            for node_type in ['Gene', 'Compound', 'Disease', 'Anatomy']:
-                session.run(f"CREATE INDEX IF NOT EXISTS FOR (n:{node_type}) ON (n.id)")
+    def _create_indexes(self, kinds):
+        for node_type in kinds:
+            self.neo4j_driver.execute_query(
+                f"CREATE INDEX IF NOT EXISTS FOR (n:`{node_type}`) ON (n.id)",
+                database_=self.neo4j_database
+            )
+        #index population is asynchronous, wait so edge MATCHes can use them
+        self.neo4j_driver.execute_query("CALL db.awaitIndexes()", database_=self.neo4j_database)
         print("Created indexes")
     
-    def build_mongo_cache(self):
+    def build_mongo_cache(self, batch_size: int = MONGO_BATCH_SIZE):
         #Build MongoDB cache for Query 1
+        #One Cypher query for all diseases, written to Mongo in bulk batches
         print("\nBuilding MongoDB cache for diseases...")
         
-        with self.neo4j_driver.session() as session:
-            #Get all diseases
-            result = session.run("MATCH (d:Disease) RETURN d.id as id, d.name as name")
+        with self.neo4j_driver.session(database=self.neo4j_database) as session:
+            result = session.run("""
+                MATCH (d:Disease)
+                // each branch aggregates one row per related node: no cross product,
+                // no DISTINCT, and an empty list when nothing matches
+                CALL {
+                    WITH d
+                    MATCH (c:Compound)-[r:TREATS|PALLIATES]->(d)
+                    RETURN collect({id: c.id, name: c.name, type: type(r)}) as drugs
+                }
+                CALL {
+                    WITH d
+                    MATCH (d)-[gr:ASSOCIATES|UPREGULATES|DOWNREGULATES]->(g:Gene)
+                    RETURN collect({id: g.id, name: g.name, relationship: type(gr)}) as genes
+                }
+                CALL {
+                    WITH d
+                    MATCH (d)-[:LOCALIZES_TO]->(a:Anatomy)
+                    RETURN collect({id: a.id, name: a.name}) as locations
+                }
+                RETURN 
+                    d.id as id,
+                    d.name as name,
+                    drugs,
+                    genes,
+                    locations
+            """)
             
-            for record in result:
-                disease_id = record['id']
-                disease_name = record['name']
-                
-                #get disease information from Neo
-                disease_info = self._get_disease_info_from_neo4j(disease_id, disease_name)
-                
-                #store in Mongo
-                self.diseases_collection.replace_one(
-                    {'_id': disease_id},
-                    disease_info,
-                    upsert=True
-                )
+            self._bulk_replace(self.diseases_collection, (
+                {
+                    '_id': record['id'],
+                    'name': record['name'],
+                    'drugs': record['drugs'],
+                    'genes': record['genes'],
+                    'locations': record['locations']
+                }
+                for record in result
+            ), batch_size)
         
-        print(f"Cached {self.diseases_collection.count_documents({})} diseases")
+        self.diseases_collection.create_index([('name', 1)])
+        print(f"Cached {self.diseases_collection.estimated_document_count()} diseases")
     
-    def _get_disease_info_from_neo4j(self, disease_id: str, disease_name: str) -> Dict:
-        #Get disease information from Neo
-        with self.neo4j_driver.session() as session:
+    def build_treatments_cache(self, batch_size: int = MONGO_BATCH_SIZE):
+        #Build MongoDB cache for Query 2, one document per disease
+        print("\nBuilding MongoDB cache for treatments...")
+        
+        with self.neo4j_driver.session(database=self.neo4j_database) as session:
+            #aggregating subquery returns a row even for diseases with no candidates
             result = session.run("""
-                MATCH (d:Disease {id: $diseaseId})
-                OPTIONAL MATCH (c:Compound)-[r:TREATS|PALLIATES]->(d)
-                OPTIONAL MATCH (d)-[gr:ASSOCIATES|UPREGULATES|DOWNREGULATES]->(g:Gene)
-                OPTIONAL MATCH (d)-[:LOCALIZES_TO]->(a:Anatomy)
-                RETURN 
-                    d.name as disease_name,
-                    collect(DISTINCT {id: c.id, name: c.name, type: type(r)}) as drugs,
-                    collect(DISTINCT {id: g.id, name: g.name, relationship: type(gr)}) as genes,
-                    collect(DISTINCT {id: a.id, name: a.name}) as locations
-            """, diseaseId=disease_id).single()
+                MATCH (d:Disease)
+                CALL {
+                    WITH d
+                    MATCH (d)-[:LOCALIZES_TO]->(a:Anatomy)-[ar:UPREGULATES|DOWNREGULATES]->(g:Gene)
+                    WITH d, a, g, ar
+                    MATCH (c:Compound)-[cr:UPREGULATES|DOWNREGULATES]->(g)
+                    WHERE type(cr) <> type(ar)
+                      AND NOT (c)-[:TREATS|PALLIATES]->(d)
+                    WITH c, collect(DISTINCT {
+                        gene: g.name,
+                        compound_effect: type(cr),
+                        anatomy: a.name,
+                        anatomy_effect: type(ar)
+                    }) as mechanisms
+                    ORDER BY c.name
+                    RETURN collect({
+                        compound_id: c.id,
+                        compound_name: c.name,
+                        mechanisms: mechanisms
+                    }) as treatments
+                }
+                RETURN d.id as id, treatments
+            """)
             
-            return {
-                '_id': disease_id,
-                'name': result['disease_name'],
-                'drugs': [d for d in result['drugs'] if d['id'] is not None],
-                'genes': [g for g in result['genes'] if g['id'] is not None],
-                'locations': [l for l in result['locations'] if l['id'] is not None]
-            }
+            self._bulk_replace(self.treatments_collection, (
+                {
+                    '_id': record['id'],
+                    'potential_treatments_count': len(record['treatments']),
+                    'treatments': record['treatments']
+                }
+                for record in result
+            ), batch_size)
+        
+        print(f"Cached treatments for {self.treatments_collection.estimated_document_count()} diseases")
+    
+    def _bulk_replace(self, collection, docs, batch_size: int):
+        #Upsert documents by _id in unordered bulk_write batches
+        ops = []
+        for doc in docs:
+            ops.append(ReplaceOne({'_id': doc['_id']}, doc, upsert=True))
+            if len(ops) >= batch_size:
+                collection.bulk_write(ops, ordered=False)
+                ops = []
+        
+        if ops:
+            collection.bulk_write(ops, ordered=False)
     
     # ==================== QUERIES ====================
     
@@ -177,29 +539,48 @@ class HetioNetDB:
         
         if use_cache:
             #Query from MongoDB cache
-            result = self.diseases_collection.find_one({'_id': disease_id})
+            result = self.diseases_collection.find_one(
+                {'_id': disease_id},
+                projection={'name': 1, 'drugs': 1, 'genes': 1, 'locations': 1}
+            )
             source = "MongoDB (cached)"
         else:
             #Query directly from Neo4j
-            with self.neo4j_driver.session() as session:
-                neo_result = session.run("""
-                    MATCH (d:Disease {id: $diseaseId})
-                    OPTIONAL MATCH (c:Compound)-[r:TREATS|PALLIATES]->(d)
-                    OPTIONAL MATCH (d)-[gr:ASSOCIATES|UPREGULATES|DOWNREGULATES]->(g:Gene)
-                    OPTIONAL MATCH (d)-[:LOCALIZES_TO]->(a:Anatomy)
-                    RETURN 
-                        d.name as disease_name,
-                        collect(DISTINCT {id: c.id, name: c.name, type: type(r)}) as drugs,
-                        collect(DISTINCT {id: g.id, name: g.name, relationship: type(gr)}) as genes,
-                        collect(DISTINCT {id: a.id, name: a.name}) as locations
-                """, diseaseId=disease_id).single()
-                
+            neo_result = self.neo4j_driver.execute_query("""
+                MATCH (d:Disease {id: $diseaseId})
+                // each branch aggregates one row per related node: no cross product,
+                // no DISTINCT, and an empty list when nothing matches
+                CALL {
+                    WITH d
+                    MATCH (c:Compound)-[r:TREATS|PALLIATES]->(d)
+                    RETURN collect({id: c.id, name: c.name, type: type(r)}) as drugs
+                }
+                CALL {
+                    WITH d
+                    MATCH (d)-[gr:ASSOCIATES|UPREGULATES|DOWNREGULATES]->(g:Gene)
+                    RETURN collect({id: g.id, name: g.name, relationship: type(gr)}) as genes
+                }
+                CALL {
+                    WITH d
+                    MATCH (d)-[:LOCALIZES_TO]->(a:Anatomy)
+                    RETURN collect({id: a.id, name: a.name}) as locations
+                }
+                RETURN 
+                    d.name as disease_name,
+                    drugs,
+                    genes,
+                    locations
+            """, diseaseId=disease_id, database_=self.neo4j_database,
+                result_transformer_=Result.single)
+            
+            result = None
+            if neo_result is not None:
                 result = {
                     '_id': disease_id,
                     'name': neo_result['disease_name'],
-                    'drugs': [d for d in neo_result['drugs'] if d['id'] is not None],
-                    'genes': [g for g in neo_result['genes'] if g['id'] is not None],
-                    'locations': [l for l in neo_result['locations'] if l['id'] is not None]
+                    'drugs': neo_result['drugs'],
+                    'genes': neo_result['genes'],
+                    'locations': neo_result['locations']
                 }
             source = "Neo4j (direct)"
         
@@ -211,45 +592,59 @@ class HetioNetDB:
         
         return result
     
-    def query2_find_treatments(self, disease_id: str) -> List[Dict]:
+    def query2_find_treatments(self, disease_id: str, use_cache: bool = True) -> Dict:
         # Query 2: Find potential new treatments
         start_time = time.time()
         
-        with self.neo4j_driver.session() as session:
-            result = session.run("""
-                // Find disease and its locations
-                MATCH (d:Disease {id: $diseaseId})-[:LOCALIZES_TO]->(a:Anatomy)
-                
-                // Find genes regulated by both compound and anatomy in opposite directions
-                MATCH (c:Compound)-[cr:UPREGULATES|DOWNREGULATES]->(g:Gene)
-                MATCH (a)-[ar:UPREGULATES|DOWNREGULATES]->(g)
-                
-                // Ensure opposite regulation
-                WHERE (type(cr) = 'UPREGULATES' AND type(ar) = 'DOWNREGULATES')
-                   OR (type(cr) = 'DOWNREGULATES' AND type(ar) = 'UPREGULATES')
-                
-                // Exclude existing treatments
-                AND NOT (c)-[:TREATS|PALLIATES]->(d)
-                
-                RETURN DISTINCT 
-                    c.id as compound_id, 
-                    c.name as compound_name,
-                    collect(DISTINCT {
-                        gene: g.name,
-                        compound_effect: type(cr),
-                        anatomy: a.name,
-                        anatomy_effect: type(ar)
-                    }) as mechanisms
-                ORDER BY compound_name
-            """, diseaseId=disease_id)
+        if use_cache:
+            #Query from MongoDB cache
+            cached = self.treatments_collection.find_one(
+                {'_id': disease_id},
+                projection={'potential_treatments_count': 1, 'treatments': 1}
+            )
+            
+            if cached:
+                elapsed_time = time.time() - start_time
+                return {
+                    'disease_id': disease_id,
+                    'potential_treatments_count': cached['potential_treatments_count'],
+                    'treatments': cached['treatments'],
+                    'query_time_ms': round(elapsed_time * 1000, 2),
+                    'data_source': "MongoDB (cached)"
+                }
+            
+            #no cache entry (cache not built or stale), answer from Neo4j instead
+            source = "Neo4j (cache miss)"
+        else:
+            source = "Neo4j (direct)"
+        
+        #Query directly from Neo4j
+        #Result.data shapes each record into a dict inside the driver
+        treatments = self.neo4j_driver.execute_query("""
+            // Seed from the disease: its locations and the genes they regulate
+            MATCH (d:Disease {id: $diseaseId})-[:LOCALIZES_TO]->(a:Anatomy)
+                  -[ar:UPREGULATES|DOWNREGULATES]->(g:Gene)
+            WITH d, a, g, ar
+            
+            // Expand to compounds regulating those genes in the opposite direction
+            MATCH (c:Compound)-[cr:UPREGULATES|DOWNREGULATES]->(g)
+            WHERE type(cr) <> type(ar)
+            
+            // Exclude existing treatments
+              AND NOT (c)-[:TREATS|PALLIATES]->(d)
             
-            treatments = []
-            for record in result:
-                treatments.append({
-                    'compound_id': record['compound_id'],
-                    'compound_name': record['compound_name'],
-                    'mechanisms': record['mechanisms']
-                })
+            RETURN DISTINCT 
+                c.id as compound_id, 
+                c.name as compound_name,
+                collect(DISTINCT {
+                    gene: g.name,
+                    compound_effect: type(cr),
+                    anatomy: a.name,
+                    anatomy_effect: type(ar)
+                }) as mechanisms
+            ORDER BY compound_name
+        """, diseaseId=disease_id, database_=self.neo4j_database,
+            result_transformer_=Result.data)
         
         elapsed_time = time.time() - start_time
         
@@ -257,7 +652,8 @@ class HetioNetDB:
             'disease_id': disease_id,
             'potential_treatments_count': len(treatments),
             'treatments': treatments,
-            'query_time_ms': round(elapsed_time * 1000, 2)
+            'query_time_ms': round(elapsed_time * 1000, 2),
+            'data_source': source
         }
 
 
@@ -270,19 +666,23 @@ def create_database(args):
         neo4j_user=args.neo4j_user,
         neo4j_password=args.neo4j_password,
         mongo_uri=args.mongo_uri,
-        mongo_db=args.mongo_db
+        mongo_db=args.mongo_db,
+        pool_size=args.pool_size,
+        pool_timeout=args.pool_timeout,
+        neo4j_database=args.neo4j_database
     )
     
     print("\n" + "="*60)
     print("CREATING HETIONET DATABASE")
     print("="*60)
     
-    db.load_nodes(args.nodes_file)
-    db.load_edges(args.edges_file)
+    db.load_nodes(args.nodes_file, use_apoc=args.apoc)
+    db.load_edges(args.edges_file, use_apoc=args.apoc)
     
     #MongoDB cache
     if args.build_cache:
         db.build_mongo_cache()
+        db.build_treatments_cache()
     
     print("\nDatabase creation complete!")
     db.close()
@@ -295,7 +695,10 @@ def query_disease(args):
         neo4j_user=args.neo4j_user,
         neo4j_password=args.neo4j_password,
         mongo_uri=args.mongo_uri,
-        mongo_db=args.mongo_db
+        mongo_db=args.mongo_db,
+        pool_size=args.pool_size,
+        pool_timeout=args.pool_timeout,
+        neo4j_database=args.neo4j_database
     )
     
     print("\n" + "="*60)
@@ -334,14 +737,17 @@ def find_treatments(args):
         neo4j_user=args.neo4j_user,
         neo4j_password=args.neo4j_password,
         mongo_uri=args.mongo_uri,
-        mongo_db=args.mongo_db
+        mongo_db=args.mongo_db,
+        pool_size=args.pool_size,
+        pool_timeout=args.pool_timeout,
+        neo4j_database=args.neo4j_database
     )
     
     print("\n" + "="*60)
     print(f"QUERY 2: FIND POTENTIAL TREATMENTS")
     print("="*60)
     
-    result = db.query2_find_treatments(args.disease_id)
+    result = db.query2_find_treatments(args.disease_id, use_cache=not args.no_cache)
     
     print(f"\nDisease ID: {result['disease_id']}")
     print(f"Potential Treatments Found: {result['potential_treatments_count']}")
@@ -358,6 +764,7 @@ def find_treatments(args):
                     print(f"     Location ({mech['anatomy']}): {mech['anatomy_effect']}")
     
     print(f"\nQuery Time: {result['query_time_ms']} ms")
+    print(f"Data Source: {result['data_source']}")
     db.close()
 
 
@@ -377,9 +784,17 @@ def main():
     create_parser.add_argument('--neo4j-uri', default='bolt://localhost:7687')
     create_parser.add_argument('--neo4j-user', default='neo4j')
     create_parser.add_argument('--neo4j-password', required=True)
+    create_parser.add_argument('--neo4j-database', default=None,
+                               help='Neo4j database name (default: server default database)')
     create_parser.add_argument('--mongo-uri', default='mongodb://localhost:27017')
     create_parser.add_argument('--mongo-db', default='hetionet')
-    create_parser.add_argument('--build-cache', action='store_true', help='Build MongoDB cache')
+    create_parser.add_argument('--pool-size', type=int, default=32,
+                               help='Neo4j connection pool size (default: 32)')
+    create_parser.add_argument('--pool-timeout', type=float, default=60.0,
+                               help='Seconds to wait for a pooled Neo4j connection')
+    create_parser.add_argument('--build-cache', action='store_true', help='Build MongoDB caches for Query 1 and Query 2')
+    create_parser.add_argument('--apoc', action='store_true',
+                               help='Load nodes and edges with APOC procedures (requires APOC)')
     create_parser.set_defaults(func=create_database)
     
     #Query 1 command
@@ -388,8 +803,14 @@ def main():
     query1_parser.add_argument('--neo4j-uri', default='bolt://localhost:7687')
     query1_parser.add_argument('--neo4j-user', default='neo4j')
     query1_parser.add_argument('--neo4j-password', required=True)
+    query1_parser.add_argument('--neo4j-database', default=None,
+                               help='Neo4j database name (default: server default database)')
     query1_parser.add_argument('--mongo-uri', default='mongodb://localhost:27017')
     query1_parser.add_argument('--mongo-db', default='hetionet')
+    query1_parser.add_argument('--pool-size', type=int, default=8,
+                               help='Neo4j connection pool size (default: 8)')
+    query1_parser.add_argument('--pool-timeout', type=float, default=60.0,
+                               help='Seconds to wait for a pooled Neo4j connection')
     query1_parser.add_argument('--no-cache', action='store_true', help='Query Neo4j directly')
     query1_parser.set_defaults(func=query_disease)
     
@@ -399,8 +820,15 @@ def main():
     query2_parser.add_argument('--neo4j-uri', default='bolt://localhost:7687')
     query2_parser.add_argument('--neo4j-user', default='neo4j')
     query2_parser.add_argument('--neo4j-password', required=True)
+    query2_parser.add_argument('--neo4j-database', default=None,
+                               help='Neo4j database name (default: server default database)')
     query2_parser.add_argument('--mongo-uri', default='mongodb://localhost:27017')
     query2_parser.add_argument('--mongo-db', default='hetionet')
+    query2_parser.add_argument('--pool-size', type=int, default=8,
+                               help='Neo4j connection pool size (default: 8)')
+    query2_parser.add_argument('--pool-timeout', type=float, default=60.0,
+                               help='Seconds to wait for a pooled Neo4j connection')
+    query2_parser.add_argument('--no-cache', action='store_true', help='Query Neo4j directly')
     query2_parser.add_argument('--verbose', '-v', action='store_true', help='Show detailed mechanisms')
     query2_parser.set_defaults(func=find_treatments)
     